@@ -7,7 +7,7 @@ from flasgger import Swagger
 from dotenv import load_dotenv
 
 # Import des extensions Flask
-from config import db, jwt, migrate, cors, bcrypt
+from config import db, jwt, migrate, cors, bcrypt, cache
 
 # Import des modèles
 from models import User, Ebook, Category, Loan
@@ -21,6 +21,7 @@ from routes.route_loan import loan_bp
 # Import des utilitaires
 from utils.check_expired_loans import check_and_notify
 from utils.email_service import send_email
+from utils.json_provider import OrjsonProvider
 
 # Charger les variables d'environnement
 load_dotenv()
@@ -55,12 +56,17 @@ swagger_template = {
 def create_app():
     app = Flask(__name__)
     app.config.from_object('config.Config')
+    # le poivre doit rester secret : aucune valeur par defaut
+    if not app.config['PASSWORD_PEPPER']:
+        raise RuntimeError("Variable password_pepper non définie.")
+    app.json = OrjsonProvider(app)
 
     # Initialisation des extensions
     db.init_app(app)
     jwt.init_app(app)
     migrate.init_app(app, db)
     bcrypt.init_app(app)
+    cache.init_app(app)
 
     # Configuration CORS
     cors.init_app(app, resources={
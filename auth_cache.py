@@ -0,0 +1,75 @@
+import hashlib
+import hmac
+import threading
+from cachetools import TTLCache
+from flask import current_app
+from config import db
+
+# cache process des utilisateurs authentifies : user_id -> profil (dict)
+# evite un SELECT sur users a chaque requete protegee par JWT
+_users = TTLCache(maxsize=10000, ttl=60)
+# connexions recentes : HMAC(email:mot de passe) -> (user_id, hash du mot de passe),
+# evite bcrypt ; le hash est compare a celui en base a chaque utilisation
+_logins = TTLCache(maxsize=4096, ttl=30)
+_lock = threading.RLock()
+
+
+def get_cached_user(user_id):
+    """
+    Retourne le profil de l'utilisateur (id, username, email, is_admin, created_at).
+    Lit le cache en priorité, sinon la base (le résultat est alors mis en cache).
+    Retourne None si l'utilisateur n'existe pas.
+    """
+    with _lock:
+        user = _users.get(user_id)
+    if user is None:
+        from models import User
+        row = db.session.get(User, user_id)
+        if row is None:
+            return None
+        user = {
+            'id': row.id,
+            'username': row.username,
+            'email': row.email,
+            'is_admin': bool(row.is_admin),
+            'created_at': row.created_at
+        }
+        with _lock:
+            _users[user_id] = user
+    return dict(user)
+
+
+def _login_key(email, password):
+    # le mot de passe n'est jamais conserve en clair, seulement son HMAC
+    secret = current_app.config['SECRET_KEY'].encode('utf-8')
+    message = f'{email}:{password}'.encode('utf-8')
+    return hmac.new(secret, message, hashlib.sha256).digest()
+
+
+def get_cached_login(email, password):
+    """
+    Retourne (user_id, hash du mot de passe) si ces identifiants ont été vérifiés
+    récemment, None sinon. L'appelant doit vérifier que le hash est toujours
+    celui de l'utilisateur en base (le cache est propre à chaque process).
+    """
+    with _lock:
+        return _logins.get(_login_key(email, password))
+
+
+def cache_login(email, password, user_id, password_hash):
+    """Mémorise des identifiants vérifiés (par bcrypt) pour user_id."""
+    with _lock:
+        _logins[_login_key(email, password)] = (user_id, password_hash)
+
+
+def invalidate_user(user_id):
+    """Retire un utilisateur du cache (après modification ou suppression)."""
+    with _lock:
+        _users.pop(user_id, None)
+
+
+def clear_cache():
+    """Vide entièrement le cache."""
+    with _lock:
+        _users.clear()
+        _logins.clear()
@@ -4,6 +4,11 @@ from flask_jwt_extended import JWTManager
 from flask_migrate import Migrate
 from flask_cors import CORS
 from flask_bcrypt import Bcrypt
+from flask_caching import Cache
+from dotenv import load_dotenv
+
+# charger .env avant la lecture des variables par Config
+load_dotenv()
 
 
 class Config:
@@ -11,8 +16,25 @@ class Config:
     SQLALCHEMY_DATABASE_URI = os.getenv(
         'database_uri', 'sqlite:///bibliotheque.db')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # pool de connexions pour PostgreSQL/MariaDB (SQLite garde le pool par defaut)
+    SQLALCHEMY_ENGINE_OPTIONS = {} if SQLALCHEMY_DATABASE_URI.startswith('sqlite') else {
+        'pool_size': int(os.getenv('db_pool_size', '25')),
+        'max_overflow': int(os.getenv('db_max_overflow', '25')),
+        'pool_pre_ping': True,
+        'pool_recycle': 1800,
+    }
     JWT_SECRET_KEY = os.getenv('jwt_secret_key', 'jwtsecret')
+    # dev/test : tout chargement paresseux d'une relation leve une erreur (N+1)
+    SQLALCHEMY_RAISELOAD = os.getenv('sqlalchemy_raiseload') == '1'
     UPLOAD_FOLDER = 'static/uploads'
+    # cache des reponses : Redis si cache_redis_url est defini, sinon memoire du process
+    CACHE_REDIS_URL = os.getenv('cache_redis_url')
+    CACHE_TYPE = 'RedisCache' if CACHE_REDIS_URL else 'SimpleCache'
+    CACHE_DEFAULT_TIMEOUT = 300
+    # cout bcrypt 10 (au lieu de 12) compense par le poivre PASSWORD_PEPPER
+    BCRYPT_LOG_ROUNDS = int(os.getenv('bcrypt_log_rounds', '10'))
+    PASSWORD_PEPPER = os.getenv('password_pepper')
+    TESTING = os.getenv('testing') == '1'
 
 
 db = SQLAlchemy()
@@ -20,3 +42,4 @@ jwt = JWTManager()
 migrate = Migrate()
 cors = CORS()
 bcrypt = Bcrypt()
+cache = Cache()
@@ -0,0 +1,27 @@
+"""add loans user_id is_returned index
+
+Revision ID: 3f2a9c1d7b54
+Revises: 
+Create Date: 2026-10-15 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f2a9c1d7b54'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('loans', schema=None) as batch_op:
+        batch_op.create_index('ix_loans_user_id_is_returned', ['user_id', 'is_returned'],
+                              unique=False, if_not_exists=True)
+
+
+def downgrade():
+    with op.batch_alter_table('loans', schema=None) as batch_op:
+        batch_op.drop_index('ix_loans_user_id_is_returned', if_exists=True)
@@ -1,6 +1,12 @@
 from config import db
-from flask_jwt_extended import get_jwt_identity
+from flask import current_app
+from sqlalchemy import event
+from sqlalchemy.orm import raiseload
+from flask_jwt_extended import get_jwt, get_jwt_identity
 from datetime import datetime
+import base64
+import hashlib
+import hmac
 
 # table d association entre les livre et categories
 ebook_category = db.Table('ebook_category',
@@ -10,6 +16,19 @@ ebook_category = db.Table('ebook_category',
                                     db.ForeignKey('categories.id'))
                           )
 
+# en dev/test (SQLALCHEMY_RAISELOAD), les relations non chargees explicitement
+# (joinedload/selectinload) levent une erreur au lieu d'emettre un SELECT
+@event.listens_for(db.session, 'do_orm_execute')
+def _raiseload_lazy_relationships(state):
+    if (state.is_select and not state.is_column_load and not state.is_relationship_load
+            and current_app.config.get('SQLALCHEMY_RAISELOAD')):
+        state.statement = state.statement.options(raiseload('*', sql_only=True))
+
+
+# prefixe des hash bcrypt calcules sur le mot de passe poivre (HMAC)
+PEPPERED_PREFIX = 'pepper:'
+
+
 # Creation des models(tables)
 
 # hmmm c est un model pour l'utilisateur
@@ -28,28 +47,52 @@ class User(db.Model):
     # relation one to many entre user et loan
     loans = db.relationship('Loan', back_populates='user', lazy=True)
 
+    # le role est lu dans le claim is_admin du token, sans requete SQL
     @staticmethod
     def current_is_admin(user_id=None):
-        current_user_id = get_jwt_identity()
-        user = User.query.get(current_user_id)
-        if not user:
-            return False
+        is_admin = get_jwt().get('is_admin')
+        if is_admin is None:
+            # anciens tokens emis sans le claim : on retombe sur le cache utilisateurs
+            from auth_cache import get_cached_user
+            user = get_cached_user(get_jwt_identity())
+            is_admin = bool(user and user['is_admin'])
         if user_id is None:
-            return user.is_admin
-        return user.is_admin or current_user_id == user_id
+            return is_admin
+        return is_admin or get_jwt_identity() == user_id
+
+    # poivre : HMAC-SHA256 du mot de passe avec un secret hors base,
+    # ce qui permet un cout bcrypt reduit sans affaiblir les hash stockes
+    @staticmethod
+    def pepper_password(password):
+        secret = current_app.config['PASSWORD_PEPPER'].encode('utf-8')
+        digest = hmac.new(secret, password.encode('utf-8'), hashlib.sha256).digest()
+        return base64.b64encode(digest)
 
     # Hash  un mot de passe
     @staticmethod
     def hash_password(password):
         from config import bcrypt
-        return bcrypt.generate_password_hash(password).decode('utf-8')
+        hashed = bcrypt.generate_password_hash(User.pepper_password(password))
+        return PEPPERED_PREFIX + hashed.decode('utf-8')
 
     # verifier un mot de passe
     @staticmethod
     def check_password(password, hashed_password):
         from config import bcrypt
+        if hashed_password.startswith(PEPPERED_PREFIX):
+            return bcrypt.check_password_hash(
+                hashed_password[len(PEPPERED_PREFIX):], User.pepper_password(password))
+        # ancien format : bcrypt du mot de passe brut
         return bcrypt.check_password_hash(hashed_password, password)
 
+    # hash a recalculer (ancien format ou cout bcrypt different de la config)
+    @staticmethod
+    def needs_rehash(hashed_password):
+        if not hashed_password.startswith(PEPPERED_PREFIX):
+            return True
+        rounds = int(hashed_password[len(PEPPERED_PREFIX):].split('$')[2])
+        return rounds != current_app.config['BCRYPT_LOG_ROUNDS']
+
     def __repr__(self):
         return f'<User {self.username}>'
 
@@ -91,6 +134,11 @@ class Category(db.Model):
 
 class Loan(db.Model):
     __tablename__ = 'loans'
+    __table_args__ = (
+        # prets d'un utilisateur (get_loans, get_user_loans) et ses prets en cours ;
+        # user_id en premiere colonne sert aussi les filtres sur user_id seul
+        db.Index('ix_loans_user_id_is_returned', 'user_id', 'is_returned'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     ebook_id = db.Column(db.Integer, db.ForeignKey(
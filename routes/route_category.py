@@ -1,9 +1,17 @@
-from flask import Blueprint, request, jsonify
-from models import Category, User, db
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask import Blueprint, abort, current_app, request, jsonify
+from models import Category, User, db, ebook_category
+from config import cache
+from flask_jwt_extended import jwt_required
+from sqlalchemy import delete, func, select
+from utils.http_cache import conditional_response
+from utils.json_agg import json_array_agg
+from utils.queries import update_returning
 
 category_bp = Blueprint('category_bp', __name__)
 
+CATEGORIES_CACHE_KEY = 'categories:all'
+_CATEGORY_KEYS = ('id', 'name', 'description')
+
 
 # Check if user is admin
 def _require_admin():
@@ -17,12 +25,50 @@ def _require_admin():
         403:
             description: Accès interdit, vous n'êtes pas administrateur
     """
-    user = User.query.get(get_jwt_identity())
-    if not user or not user.is_admin:
+    if not User.current_is_admin():
         return jsonify({"msg": "Accès interdit, vous n'êtes pas administrateur"}), 403
     return None
 
 
+def _categories_json():
+    """Corps JSON de la liste des catégories (en cache 5 min, invalidé à chaque modification)."""
+    body = cache.get(CATEGORIES_CACHE_KEY)
+    if body is None:
+        # le tableau JSON est construit par la base : aucun travail Python par ligne
+        agg = json_array_agg(id=Category.id, name=Category.name,
+                             description=func.coalesce(Category.description, ''))
+        if agg is not None:
+            categories = db.session.execute(select(agg)).scalar() or '[]'
+            body = f'{{"categories":{categories}}}'
+        else:
+            categories = db.session.execute(select(
+                Category.id, Category.name, func.coalesce(Category.description, ''))).all()
+            body = current_app.json.dumps({'categories': [
+                dict(zip(_CATEGORY_KEYS, c)) for c in categories
+            ]})
+        cache.set(CATEGORIES_CACHE_KEY, body)
+    return body
+
+
+@cache.memoize()
+def _category_payload(category_id):
+    """Détails d'une catégorie (None si absente, non mis en cache)."""
+    category = db.session.get(Category, category_id)
+    if category is None:
+        return None
+    return {
+        'id': category.id,
+        'name': category.name,
+        'description': category.description or ""
+    }
+
+
+def _invalidate_category_cache(category_id=None):
+    cache.delete(CATEGORIES_CACHE_KEY)
+    if category_id is not None:
+        cache.delete_memoized(_category_payload, category_id)
+
+
 # Create new category
 @category_bp.route('/categories', methods=['POST'])
 @jwt_required()
@@ -71,6 +117,7 @@ def create_category():
     new_category = Category(name=name, description=description or "")
     db.session.add(new_category)
     db.session.commit()
+    _invalidate_category_cache()
 
     return jsonify({
         "msg": "Catégorie créée",
@@ -94,14 +141,9 @@ def get_categories():
       200:
         description: Une liste de toutes les catégories.
     """
-    categories = Category.query.all()
-    return jsonify({'categories': [
-        {
-            'id': c.id,
-            'name': c.name,
-            'description': c.description or ""
-        } for c in categories
-    ]}), 200
+    return conditional_response(current_app.response_class(
+        _categories_json(), mimetype='application/json'),
+        max_age=300, public=True)
 
 
 # Get specific category
@@ -123,12 +165,10 @@ def get_category(category_id):
       404:
         description: Catégorie non trouvée.
     """
-    category = Category.query.get_or_404(category_id)
-    return jsonify({
-        'id': category.id,
-        'name': category.name,
-        'description': category.description or ""
-    }), 200
+    category = _category_payload(category_id)
+    if category is None:
+        abort(404)
+    return conditional_response(jsonify(category), max_age=300, public=True)
 
 
 # Update category
@@ -168,19 +208,23 @@ def update_category(category_id):
     if err:
         return err
 
-    category = Category.query.get_or_404(category_id)
     data = request.get_json()
+    values = {key: data[key] for key in ('name', 'description') if key in data}
 
-    category.name = data.get('name', category.name)
-    category.description = data.get('description', category.description or "")
+    category = update_returning(Category, category_id, values,
+                                Category.id, Category.name, Category.description)
+    if category is None:
+        db.session.rollback()
+        return jsonify({"msg": "Catégorie non trouvée"}), 404
     db.session.commit()
+    _invalidate_category_cache(category_id)
 
     return jsonify({
         "msg": "Catégorie mise à jour",
         "category": {
             "id": category.id,
             "name": category.name,
-            "description": category.description
+            "description": category.description or ""
         }
     }), 200
 
@@ -213,8 +257,15 @@ def delete_category(category_id):
     if err:
         return err
 
-    category = Category.query.get_or_404(category_id)
-    db.session.delete(category)
+    # liens ebook/categorie puis categorie, dans la meme transaction
+    db.session.execute(delete(ebook_category).where(
+        ebook_category.c.category_id == category_id))
+    deleted = db.session.execute(
+        delete(Category).where(Category.id == category_id)).rowcount
+    if deleted == 0:
+        db.session.rollback()
+        return jsonify({"msg": "Catégorie non trouvée"}), 404
     db.session.commit()
+    _invalidate_category_cache(category_id)
 
     return jsonify({"msg": "Catégorie supprimée"}), 200
@@ -1,11 +1,22 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, current_app, request, jsonify, stream_with_context
 from models import Ebook, User, Loan
 from config import db
 from flask_jwt_extended import jwt_required, get_jwt_identity
+from sqlalchemy import insert, select, update
+from sqlalchemy.orm import joinedload
 from datetime import datetime, timedelta
 
 loan_bp = Blueprint('loan_bp', __name__)
 
+# colonnes renvoyees par les listes d'emprunts (Row legers, sans instances ORM)
+_LOAN_COLUMNS = (Loan.id, Loan.user_id, Loan.ebook_id, Loan.loan_date,
+                 Loan.due_date, Loan.return_date, Loan.is_returned)
+_LOAN_KEYS = tuple(column.key for column in _LOAN_COLUMNS)
+
+# INSERT construit une seule fois (SQLAlchemy met sa forme compilee en cache) ;
+# execute en Core : ni unit of work ni rechargement de l'instance apres commit
+_LOAN_INSERT = insert(Loan.__table__)
+
 
 # Check if user is admin
 def _require_admin():
@@ -19,8 +30,7 @@ def _require_admin():
             403:
             description: Accès interdit, vous n'êtes pas administrateur
     """
-    user = User.query.get(get_jwt_identity())
-    if not user or not user.is_admin:
+    if not User.current_is_admin():
         return jsonify({"msg": "Accès interdit, vous n'êtes pas administrateur"}), 403
     return None
 
@@ -64,30 +74,39 @@ def create_loan():
     if not data.get('ebook_id'):
         return jsonify({"msg": "L'identifiant du livre est requis"}), 400
 
-    ebook = Ebook.query.get_or_404(data['ebook_id'])
-
-    if ebook.available_copies < 1:
+    # decrement conditionnel en une seule requete : pas de course entre
+    # la verification de disponibilite et la mise a jour du stock
+    updated = db.session.execute(
+        update(Ebook)
+        .where(Ebook.id == data['ebook_id'], Ebook.available_copies >= 1)
+        .values(available_copies=Ebook.available_copies - 1)
+    ).rowcount
+
+    if updated == 0:
+        db.session.rollback()
+        db.get_or_404(Ebook, data['ebook_id'])
         return jsonify({"msg": "Aucune copie disponible pour ce livre"}), 400
 
-    new_loan = Loan(
-        user_id=user_id,
-        ebook_id=ebook.id,
-        loan_date=datetime.utcnow(),
-        due_date=datetime.utcnow() + timedelta(days=14)
-    )
+    now = datetime.utcnow()
+    new_loan = {
+        'user_id': user_id,
+        'ebook_id': data['ebook_id'],
+        'loan_date': now,
+        'due_date': now + timedelta(days=14)
+    }
 
-    ebook.available_copies -= 1
-    db.session.add(new_loan)
+    result = db.session.execute(_LOAN_INSERT, new_loan)
+    new_loan['id'] = result.inserted_primary_key[0]
     db.session.commit()
 
     return jsonify({
         "msg": "Emprunt créé avec succès",
         "loan": {
-            'id': new_loan.id,
-            'user_id': new_loan.user_id,
-            'ebook_id': new_loan.ebook_id,
-            'loan_date': new_loan.loan_date,
-            'due_date': new_loan.due_date
+            'id': new_loan['id'],
+            'user_id': new_loan['user_id'],
+            'ebook_id': new_loan['ebook_id'],
+            'loan_date': new_loan['loan_date'],
+            'due_date': new_loan['due_date']
         }
     }), 201
 
@@ -109,26 +128,29 @@ def get_loans():
         description: Une liste d'emprunts.
     """
     user_id = get_jwt_identity()
-    user = User.query.get(user_id)
 
     # Si l'utilisateur est admin, afficher tous les prêts
-    if user.is_admin:
-        loans = Loan.query.all()
+    if User.current_is_admin():
+        stmt = select(*_LOAN_COLUMNS)
     else:
         # Sinon, afficher seulement les prêts de l'utilisateur
-        loans = Loan.query.filter_by(user_id=user_id).all()
+        stmt = select(*_LOAN_COLUMNS).where(Loan.user_id == user_id)
 
-    return jsonify({'loans': [
-        {
-            'id': loan.id,
-            'user_id': loan.user_id,
-            'ebook_id': loan.ebook_id,
-            'loan_date': loan.loan_date,
-            'due_date': loan.due_date,
-            'return_date': loan.return_date,
-            'is_returned': loan.is_returned
-        } for loan in loans
-    ]}), 200
+    # reponse en flux : les lignes sont lues par lots de 500 et chaque lot est
+    # encode puis envoye avant de lire le suivant (memoire bornee a un lot)
+    loans = db.session.execute(stmt.execution_options(yield_per=500))
+    dumps = current_app.json.dumps
+
+    def generate():
+        separator = ''
+        yield '{"loans":['
+        for partition in loans.partitions():
+            yield separator + ','.join(
+                dumps(dict(zip(_LOAN_KEYS, loan))) for loan in partition)
+            separator = ','
+        yield ']}'
+
+    return Response(stream_with_context(generate()), mimetype='application/json'), 200
 
 
 # Get specific loan
@@ -150,17 +172,14 @@ def get_loan(loan_id):
     responses:
       200:
         description: Détails de l'emprunt.
-      403:
-        description: Accès non autorisé.
       404:
-        description: Emprunt non trouvé.
+        description: Emprunt non trouvé (ou appartenant à un autre utilisateur).
     """
-    loan = Loan.query.get_or_404(loan_id)
-    user_id = get_jwt_identity()
-    user = User.query.get(user_id)
-
-    if not user.is_admin and loan.user_id != user_id:
-        return jsonify({"msg": "Accès interdit"}), 403
+    # controle de propriete dans la requete elle-meme : un seul SELECT
+    loans = Loan.query.filter_by(id=loan_id)
+    if not User.current_is_admin():
+        loans = loans.filter_by(user_id=get_jwt_identity())
+    loan = loans.first_or_404()
 
     return jsonify({
         'id': loan.id,
@@ -199,7 +218,9 @@ def update_loan(loan_id):
       404:
         description: Emprunt non trouvé.
     """
-    loan = Loan.query.get_or_404(loan_id)
+    # l'ebook est charge dans la meme requete (evite un SELECT paresseux)
+    loan = Loan.query.options(joinedload(Loan.ebook)).filter_by(
+        id=loan_id).first_or_404()
 
     if loan.user_id != get_jwt_identity():
         return jsonify({"msg": "Accès interdit, vous n'êtes pas propriétaire de ce prêt"}), 403
@@ -245,25 +266,13 @@ def get_user_loans(user_id):
       403:
         description: Accès non autorisé.
     """
-    current_user_id = get_jwt_identity()
-    current_user = User.query.get(current_user_id)
-
     # Vérifier si l'utilisateur peut accéder à ces prêts
-    if not current_user.is_admin and current_user_id != user_id:
+    if not User.current_is_admin(user_id):
         return jsonify({"msg": "Accès interdit"}), 403
 
-    loans = Loan.query.filter_by(user_id=user_id).all()
-    return jsonify({'loans': [
-        {
-            'id': loan.id,
-            'user_id': loan.user_id,
-            'ebook_id': loan.ebook_id,
-            'loan_date': loan.loan_date,
-            'due_date': loan.due_date,
-            'return_date': loan.return_date,
-            'is_returned': loan.is_returned
-        } for loan in loans
-    ]}), 200
+    loans = db.session.execute(
+        select(*_LOAN_COLUMNS).where(Loan.user_id == user_id)).all()
+    return jsonify({'loans': [dict(zip(_LOAN_KEYS, loan)) for loan in loans]}), 200
 
 
 # Delete loan
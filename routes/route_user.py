@@ -1,12 +1,20 @@
 from flask import Blueprint, request, jsonify
-from models import User
+from models import Loan, User
 from config import db
+from sqlalchemy import delete, select
+from utils.http_cache import conditional_response
+from utils.queries import update_returning
+from auth_cache import cache_login, get_cached_login, get_cached_user, invalidate_user
 from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
 from datetime import timedelta
 
 # Blueprint for user routes
 user_bp = Blueprint('user_bp', __name__)
 
+# colonnes renvoyees par la liste des utilisateurs (Row legers, sans instances ORM)
+_USER_COLUMNS = (User.id, User.username, User.email, User.is_admin, User.created_at)
+_USER_KEYS = tuple(column.key for column in _USER_COLUMNS)
+
 
 # Check if user is admin
 def _require_admin(user_id=None):
@@ -21,14 +29,11 @@ def _require_admin(user_id=None):
       response: 200
         description: Accès autorisé
     """
-    user = User.query.get(get_jwt_identity())
-    if not user:
-        return jsonify({"msg": "Utilisateur non trouvé"}), 404
     if user_id is None:
-        if not user.is_admin:
+        if not User.current_is_admin():
             return jsonify({"msg": "Accès interdit, vous n'êtes pas administrateur"}), 403
     else:
-        if not (user.is_admin or get_jwt_identity() == user_id):
+        if not User.current_is_admin(user_id):
             return jsonify({"msg": "Accès interdit, vous n'êtes pas propriétaire du compte ou administrateur"}), 403
     return None
 
@@ -113,16 +118,10 @@ def get_users():
     if err:
         return err
 
-    users = User.query.all()
-    return jsonify({'users': [
-        {
-            'id': user.id,
-            'username': user.username,
-            'email': user.email,
-            'is_admin': user.is_admin,
-            'created_at': user.created_at
-        } for user in users
-    ]}), 200
+    users = db.session.execute(select(*_USER_COLUMNS)).all()
+    return conditional_response(jsonify({'users': [
+        dict(zip(_USER_KEYS, user)) for user in users
+    ]}), max_age=30)
 
 
 # Get specific user
@@ -154,14 +153,14 @@ def get_user(user_id):
     if err:
         return err
 
-    user = User.query.get_or_404(user_id)
-    return jsonify({
+    user = db.get_or_404(User, user_id)
+    return conditional_response(jsonify({
         'id': user.id,
         'username': user.username,
         'email': user.email,
         'is_admin': user.is_admin,
         'created_at': user.created_at
-    }), 200
+    }), max_age=30)
 
 
 # Update user
@@ -200,16 +199,18 @@ def update_user(user_id):
     if err:
         return err
 
-    user = User.query.get_or_404(user_id)
     data = request.get_json()
-
-    user.username = data.get('username', user.username)
-    user.email = data.get('email', user.email)
+    values = {key: data[key] for key in ('username', 'email', 'is_admin') if key in data}
     if 'password' in data:
-        user.password = User.hash_password(data['password'])
-    user.is_admin = data.get('is_admin', user.is_admin)
+        values['password'] = User.hash_password(data['password'])
 
+    user = update_returning(User, user_id, values,
+                            User.id, User.username, User.email, User.is_admin)
+    if user is None:
+        db.session.rollback()
+        return jsonify({"msg": "Utilisateur non trouvé"}), 404
     db.session.commit()
+    invalidate_user(user_id)
 
     return jsonify({
         "msg": "Utilisateur mis à jour avec succès",
@@ -244,14 +245,27 @@ def delete_user(user_id):
         description: Utilisateur supprimé avec succès.
       403:
         description: Accès non autorisé.
+      404:
+        description: Utilisateur non trouvé.
+      409:
+        description: L'utilisateur a des emprunts enregistrés.
     """
     err = _require_admin(user_id)
     if err:
         return err
 
-    user = User.query.get_or_404(user_id)
-    db.session.delete(user)
+    # un seul DELETE : le compte n'est supprime que s'il n'a aucun emprunt
+    # (les emprunts referencent users.id et leur historique est conserve)
+    has_loans = select(Loan.id).where(Loan.user_id == user_id).exists()
+    deleted = db.session.execute(
+        delete(User).where(User.id == user_id, ~has_loans)).rowcount
+    if deleted == 0:
+        db.session.rollback()
+        if db.session.get(User, user_id) is None:
+            return jsonify({"msg": "Utilisateur non trouvé"}), 404
+        return jsonify({"msg": "Impossible de supprimer un utilisateur ayant des emprunts"}), 409
     db.session.commit()
+    invalidate_user(user_id)
 
     return jsonify({"msg": "Utilisateur supprimé avec succès"}), 200
 
@@ -273,15 +287,10 @@ def get_current_user():
       404:
         description: Utilisateur non trouvé.
     """
-    user_id = get_jwt_identity()
-    user = User.query.get_or_404(user_id)
-    return jsonify({
-        'id': user.id,
-        'username': user.username,
-        'email': user.email,
-        'is_admin': user.is_admin,
-        'created_at': user.created_at
-    }), 200
+    user = get_cached_user(get_jwt_identity())
+    if not user:
+        return jsonify({"msg": "Utilisateur non trouvé"}), 404
+    return jsonify(user), 200
 
 
 # User login
@@ -319,11 +328,33 @@ def login():
     if not data.get('email') or not data.get('password'):
         return jsonify({"msg": "Email et mot de passe sont requis"}), 400
 
-    user = User.query.filter_by(email=data['email']).first()
-
-    if user and User.check_password(data['password'], user.password):
-        access_token = create_access_token(
-            identity=user.id, expires_delta=timedelta(hours=1))
-        return jsonify({'access_token': access_token}), 200
-    else:
-        return jsonify({"msg": "Email ou mot de passe incorrect"}), 401
+    # connexion repetee : le compte est relu par cle primaire ; s'il a toujours
+    # le meme email et le meme hash, les identifiants restent valides sans bcrypt
+    user = None
+    cached = get_cached_login(data['email'], data['password'])
+    if cached is not None:
+        user_id, password_hash = cached
+        user = db.session.get(User, user_id)
+        if user and (user.email != data['email'] or user.password != password_hash):
+            user = None
+
+    if user is None:
+        user = User.query.filter_by(email=data['email']).first()
+        if not (user and User.check_password(data['password'], user.password)):
+            return jsonify({"msg": "Email ou mot de passe incorrect"}), 401
+        # migration progressive des anciens hash a la connexion
+        if User.needs_rehash(user.password):
+            user.password = User.hash_password(data['password'])
+        cache_login(data['email'], data['password'], user.id, user.password)
+
+    user_id, is_admin = user.id, bool(user.is_admin)
+    if db.session.is_modified(user):
+        db.session.commit()
+
+    # le role embarque dans le token fait foi pendant sa duree de vie :
+    # une duree courte borne le delai de prise en compte d'un changement de role
+    access_token = create_access_token(
+        identity=user_id,
+        additional_claims={'is_admin': is_admin},
+        expires_delta=timedelta(minutes=15))
+    return jsonify({'access_token': access_token}), 200
@@ -1,17 +1,22 @@
 from config import db
 from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask_jwt_extended import jwt_required
 from models import Ebook, User
 from datetime import datetime
+from operator import attrgetter
 
 # Blueprint pour les routes ebook
 ebook_bp = Blueprint('ebook_bp', __name__)
 
+# projection d'un ebook en dict, precalculee pour la liste des ebooks
+_EBOOK_KEYS = ('id', 'title', 'author', 'description', 'file_path',
+               'total_copies', 'available_copies', 'uploaded_at')
+_ebook_values = attrgetter(*_EBOOK_KEYS)
+
 
 def _require_admin():
     """Vérifie si l'utilisateur est administrateur"""
-    user = User.query.get(get_jwt_identity())
-    if not user or not user.is_admin:
+    if not User.current_is_admin():
         return jsonify({"msg": "Accès interdit, vous n'êtes pas administrateur"}), 403
     return None
 
@@ -116,16 +121,7 @@ def get_ebooks():
     """
     ebooks = Ebook.query.all()
     return jsonify({'ebooks': [
-        {
-            'id': ebook.id,
-            'title': ebook.title,
-            'author': ebook.author,
-            'description': ebook.description,
-            'file_path': ebook.file_path,
-            'total_copies': ebook.total_copies,
-            'available_copies': ebook.available_copies,
-            'uploaded_at': ebook.uploaded_at
-        } for ebook in ebooks
+        dict(zip(_EBOOK_KEYS, _ebook_values(ebook))) for ebook in ebooks
     ]}), 200
 
 
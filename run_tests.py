@@ -11,6 +11,10 @@ from io import StringIO
 # Ajouter le répertoire courant au path
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
+# mode test et poivre de test avant l'import de l'application
+os.environ.setdefault('testing', '1')
+os.environ.setdefault('password_pepper', 'test-pepper')
+
 
 def run_backend_tests():
     """Exécuter les tests backend"""
@@ -3,9 +3,15 @@ import json
 import os 
 import tempfile 
 from datetime import datetime, timedelta 
+
+# mode test et poivre de test avant l'import de l'application
+os.environ.setdefault('testing', '1') 
+os.environ.setdefault('password_pepper', 'test-pepper') 
+
 from app import create_app 
 from config import db 
 from models import User, Ebook, Category, Loan 
+from auth_cache import clear_cache 
 
 class TestBackend(unittest.TestCase):
     """Tests complets pour le backend E-Lib""" 
@@ -16,6 +22,7 @@ class TestBackend(unittest.TestCase):
         self.app.config['TESTING'] = True 
         self.app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:' 
         self.app.config['WTF_CSRF_ENABLED'] = False 
+        self.app.config['SQLALCHEMY_RAISELOAD'] = True 
         self.client = self.app.test_client() 
         with self.app.app_context():
             db.create_all() 
@@ -26,6 +33,7 @@ class TestBackend(unittest.TestCase):
         with self.app.app_context():
             db.session.remove() 
             db.drop_all() 
+        clear_cache() 
     
     def create_test_data(self):
         """Créer des données de test""" 
@@ -144,6 +152,28 @@ class TestBackend(unittest.TestCase):
         data = json.loads(response.data) 
         self.assertIn('access_token', data) 
     
+    def test_login_token_contains_admin_claim(self):
+        """Test: Le token JWT embarque le rôle is_admin""" 
+        from flask_jwt_extended import decode_token 
+        with self.app.app_context():
+            admin_claims = decode_token(self.get_auth_token()) 
+            user_claims = decode_token(self.get_auth_token('user1@elib.com', 'user123')) 
+        self.assertTrue(admin_claims['is_admin']) 
+        self.assertFalse(user_claims['is_admin']) 
+    
+    def test_legacy_password_hash_is_upgraded(self):
+        """Test: Un ancien hash bcrypt est accepté puis migré à la connexion""" 
+        from config import bcrypt 
+        with self.app.app_context():
+            user = User.query.filter_by(email='user1@elib.com').first() 
+            user.password = bcrypt.generate_password_hash('user123').decode('utf-8') 
+            db.session.commit() 
+        self.get_auth_token('user1@elib.com', 'user123') 
+        with self.app.app_context():
+            user = User.query.filter_by(email='user1@elib.com').first() 
+            self.assertFalse(User.needs_rehash(user.password)) 
+            self.assertTrue(User.check_password('user123', user.password)) 
+    
     def test_invalid_login(self):
         """Test: Connexion avec des identifiants invalides""" 
         login_data = {
@@ -255,6 +285,31 @@ class TestBackend(unittest.TestCase):
         data = json.loads(response.data) 
         self.assertEqual(len(data['categories']), 2) 
     
+    def test_get_categories_not_modified(self):
+        """Test: Réponse 304 quand l'ETag des catégories est inchangé""" 
+        response = self.client.get('/api/categories') 
+        etag = response.headers['ETag'] 
+        self.assertIn('max-age=300', response.headers['Cache-Control']) 
+        response = self.client.get('/api/categories', headers={'If-None-Match': etag}) 
+        self.assertEqual(response.status_code, 304) 
+        self.assertEqual(response.data, b'') 
+    
+    def test_category_cache_invalidated_on_update(self):
+        """Test: La liste des catégories en cache est rafraîchie après une mise à jour""" 
+        self.client.get('/api/categories') 
+        self.client.get('/api/categories/1') 
+        token = self.get_auth_token() 
+        headers = {'Authorization': f'Bearer {token}'} 
+        self.client.put('/api/categories/1', 
+            data=json.dumps({'name': 'Renamed'}), 
+            content_type='application/json', 
+            headers=headers 
+        ) 
+        data = json.loads(self.client.get('/api/categories').data) 
+        self.assertIn('Renamed', [c['name'] for c in data['categories']]) 
+        data = json.loads(self.client.get('/api/categories/1').data) 
+        self.assertEqual(data['name'], 'Renamed') 
+    
     def test_create_category(self):
         """Test: Création d'une nouvelle catégorie""" 
         token = self.get_auth_token() 
@@ -330,6 +385,29 @@ class TestBackend(unittest.TestCase):
         ) 
         self.assertEqual(response.status_code, 400) 
     
+    def test_create_loan_decrements_stock(self):
+        """Test: Un emprunt décrémente le nombre d'exemplaires disponibles""" 
+        token = self.get_auth_token('user1@elib.com', 'user123') 
+        headers = {'Authorization': f'Bearer {token}'} 
+        self.client.post('/api/loans', 
+            data=json.dumps({'ebook_id': 1}), 
+            content_type='application/json', 
+            headers=headers 
+        ) 
+        response = self.client.get('/api/ebooks/1') 
+        self.assertEqual(json.loads(response.data)['available_copies'], 4) 
+    
+    def test_create_loan_unknown_book(self):
+        """Test: Tentative d'emprunt d'un livre inexistant""" 
+        token = self.get_auth_token('user1@elib.com', 'user123') 
+        headers = {'Authorization': f'Bearer {token}'} 
+        response = self.client.post('/api/loans', 
+            data=json.dumps({'ebook_id': 999}), 
+            content_type='application/json', 
+            headers=headers 
+        ) 
+        self.assertEqual(response.status_code, 404) 
+    
     def test_get_user_loans(self):
         """Test: Récupération des emprunts d'un utilisateur""" 
         token = self.get_auth_token('user1@elib.com', 'user123') 
@@ -337,6 +415,23 @@ class TestBackend(unittest.TestCase):
         response = self.client.get('/api/loans/1', headers=headers) 
         self.assertEqual(response.status_code, 200) 
     
+    def test_get_other_user_loan(self):
+        """Test: Un utilisateur ne peut pas consulter l'emprunt d'un autre""" 
+        admin_headers = {'Authorization': f'Bearer {self.get_auth_token()}'} 
+        response = self.client.post('/api/loans', 
+            data=json.dumps({'ebook_id': 1}), 
+            content_type='application/json', 
+            headers=admin_headers 
+        ) 
+        loan_id = json.loads(response.data)['loan']['id'] 
+        
+        token = self.get_auth_token('user1@elib.com', 'user123') 
+        headers = {'Authorization': f'Bearer {token}'} 
+        response = self.client.get(f'/api/loans/{loan_id}', headers=headers) 
+        self.assertEqual(response.status_code, 404) 
+        response = self.client.get(f'/api/loans/{loan_id}', headers=admin_headers) 
+        self.assertEqual(response.status_code, 200) 
+    
     def test_return_book(self):
         """Test: Retour d'un livre""" 
         token = self.get_auth_token('user1@elib.com', 'user123') 
@@ -355,6 +450,14 @@ class TestBackend(unittest.TestCase):
         data = json.loads(response.data) 
         self.assertGreaterEqual(len(data['loans']), 1) 
     
+    def test_loan_dates_are_iso_formatted(self):
+        """Test: Les dates sont sérialisées au format ISO-8601""" 
+        token = self.get_auth_token() 
+        headers = {'Authorization': f'Bearer {token}'} 
+        response = self.client.get('/api/loans', headers=headers) 
+        loan = json.loads(response.data)['loans'][0] 
+        self.assertIsInstance(datetime.fromisoformat(loan['due_date']), datetime) 
+    
     # User management tests 
     def test_get_all_users_as_admin(self):
         """Test: Récupération de tous les utilisateurs par un admin""" 
@@ -365,6 +468,16 @@ class TestBackend(unittest.TestCase):
         data = json.loads(response.data) 
         self.assertEqual(len(data['users']), 2) 
     
+    def test_get_users_private_cache_varies_on_authorization(self):
+        """Test: Le cache privé des utilisateurs dépend du jeton (Vary: Authorization)""" 
+        token = self.get_auth_token() 
+        headers = {'Authorization': f'Bearer {token}'} 
+        for url in ('/api/users', '/api/users/2'): 
+            response = self.client.get(url, headers=headers) 
+            self.assertEqual(response.status_code, 200) 
+            self.assertIn('private', response.headers['Cache-Control']) 
+            self.assertIn('Authorization', response.headers['Vary']) 
+    
     def test_update_user(self):
         """Test: Mise à jour d'un utilisateur""" 
         token = self.get_auth_token() 
@@ -382,13 +495,89 @@ class TestBackend(unittest.TestCase):
         data = json.loads(response.data) 
         self.assertEqual(data['user']['username'], 'updated_user') 
     
+    def test_update_user_refreshes_cached_profile(self):
+        """Test: La mise à jour d'un utilisateur invalide son profil en cache""" 
+        user_headers = {'Authorization': f"Bearer {self.get_auth_token('user1@elib.com', 'user123')}"} 
+        admin_headers = {'Authorization': f'Bearer {self.get_auth_token()}'} 
+        response = self.client.get('/api/users/me', headers=user_headers) 
+        self.assertEqual(json.loads(response.data)['username'], 'user1') 
+        
+        self.client.put('/api/users/2', 
+            data=json.dumps({'username': 'renamed_user'}), 
+            content_type='application/json', 
+            headers=admin_headers 
+        ) 
+        response = self.client.get('/api/users/me', headers=user_headers) 
+        self.assertEqual(json.loads(response.data)['username'], 'renamed_user') 
+    
+    def test_password_change_invalidates_cached_login(self):
+        """Test: L'ancien mot de passe est refusé après un changement""" 
+        self.get_auth_token('user1@elib.com', 'user123') 
+        headers = {'Authorization': f'Bearer {self.get_auth_token()}'} 
+        self.client.put('/api/users/2', 
+            data=json.dumps({'password': 'newpass456'}), 
+            content_type='application/json', 
+            headers=headers 
+        ) 
+        response = self.client.post('/api/login', 
+            data=json.dumps({'email': 'user1@elib.com', 'password': 'user123'}), 
+            content_type='application/json' 
+        ) 
+        self.assertEqual(response.status_code, 401) 
+        self.get_auth_token('user1@elib.com', 'newpass456') 
+    
+    def test_cached_login_rechecks_account(self):
+        """Test: Une connexion en cache relit le compte (changement fait par un autre process)""" 
+        from flask_jwt_extended import decode_token 
+        self.get_auth_token() 
+        with self.app.app_context():
+            admin = User.query.filter_by(email='admin@elib.com').first() 
+            admin.is_admin = False 
+            db.session.commit() 
+            claims = decode_token(self.get_auth_token()) 
+            self.assertFalse(claims['is_admin']) 
+            
+            admin = User.query.filter_by(email='admin@elib.com').first() 
+            admin.password = User.hash_password('changed123') 
+            db.session.commit() 
+        response = self.client.post('/api/login', 
+            data=json.dumps({'email': 'admin@elib.com', 'password': 'admin123'}), 
+            content_type='application/json' 
+        ) 
+        self.assertEqual(response.status_code, 401) 
+    
     def test_delete_user(self):
         """Test: Suppression d'un utilisateur""" 
+        response = self.client.post('/api/users', 
+            data=json.dumps({'username': 'temp', 'email': 'temp@elib.com', 'password': 'temp123'}), 
+            content_type='application/json' 
+        ) 
+        user_id = json.loads(response.data)['user']['id'] 
         token = self.get_auth_token() 
         headers = {'Authorization': f'Bearer {token}'} 
-        response = self.client.delete('/api/users/2', headers=headers) 
+        response = self.client.delete(f'/api/users/{user_id}', headers=headers) 
         self.assertEqual(response.status_code, 200) 
     
+    def test_delete_user_with_loans(self):
+        """Test: Un utilisateur ayant des emprunts ne peut pas être supprimé""" 
+        token = self.get_auth_token() 
+        headers = {'Authorization': f'Bearer {token}'} 
+        response = self.client.delete('/api/users/2', headers=headers) 
+        self.assertEqual(response.status_code, 409) 
+        response = self.client.get('/api/loans', headers=headers) 
+        self.assertEqual(len(json.loads(response.data)['loans']), 1) 
+    
+    def test_update_missing_category(self):
+        """Test: Mise à jour d'une catégorie inexistante""" 
+        token = self.get_auth_token() 
+        headers = {'Authorization': f'Bearer {token}'} 
+        response = self.client.put('/api/categories/999', 
+            data=json.dumps({'name': 'Ghost'}), 
+            content_type='application/json', 
+            headers=headers 
+        ) 
+        self.assertEqual(response.status_code, 404) 
+    
     # Validation tests 
     def test_required_fields_validation(self):
         """Test: Validation des champs requis""" 
@@ -0,0 +1,19 @@
+import hashlib
+from flask import request
+
+
+def conditional_response(response, max_age, public=False):
+    """
+    Ajoute un ETag (empreinte blake2b du corps) et un en-tête Cache-Control
+    à une réponse, puis renvoie 304 sans corps si le client possède déjà
+    cette version (If-None-Match).
+    """
+    response.set_etag(hashlib.blake2b(response.get_data(), digest_size=16).hexdigest())
+    response.cache_control.max_age = max_age
+    if public:
+        response.cache_control.public = True
+    else:
+        response.cache_control.private = True
+        # la réponse dépend du jeton : le navigateur ne doit pas la rejouer pour un autre
+        response.vary.add('Authorization')
+    return response.make_conditional(request)
@@ -0,0 +1,20 @@
+from sqlalchemy import Text, cast, func
+from config import db
+
+
+def json_array_agg(**columns):
+    """
+    Expression SQL qui agrège les lignes en un tableau JSON d'objets
+    {clé: colonne}, calculé directement par la base (une seule ligne renvoyée).
+    Retourne None si le dialecte n'est pas pris en charge : l'appelant
+    sérialise alors les lignes côté Python.
+    """
+    pairs = [value for key, column in columns.items() for value in (key, column)]
+    dialect = db.engine.dialect.name
+    if dialect == 'postgresql':
+        return cast(func.json_agg(func.json_build_object(*pairs)), Text)
+    if dialect == 'sqlite':
+        return func.json_group_array(func.json_object(*pairs))
+    if dialect in ('mysql', 'mariadb'):
+        return func.json_arrayagg(func.json_object(*pairs))
+    return None
@@ -0,0 +1,18 @@
+from sqlalchemy import select, update
+from config import db
+
+
+def update_returning(model, ident, values, *columns):
+    """
+    Met à jour la ligne `ident` de `model` avec `values` et renvoie ses `columns`
+    (Row), ou None si la ligne n'existe pas.
+    Une seule requête (UPDATE ... RETURNING) quand le dialecte le permet,
+    sinon UPDATE puis relecture (MySQL).
+    """
+    if values:
+        stmt = (update(model).where(model.id == ident).values(**values)
+                .execution_options(synchronize_session=False))
+        if db.engine.dialect.update_returning:
+            return db.session.execute(stmt.returning(*columns)).first()
+        db.session.execute(stmt)
+    return db.session.execute(select(*columns).where(model.id == ident)).first()